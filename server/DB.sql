@@ -1,7 +1,7 @@
 CREATE TYPE status AS ENUM ('active', 'inactive', 'new');
 
 CREATE TABLE keys(
-	hash char(64) PRIMARY KEY NOT NULL,
+	hash char(64) COLLATE "C" PRIMARY KEY NOT NULL,
 	public_key varchar(300) NOT NULL,
 	current_status status DEFAULT 'new' NOT NULL,
 	name varchar(50) NOT NULL,
@@ -9,40 +9,46 @@ CREATE TABLE keys(
 );
 
 CREATE TABLE transactions(
-	hash char(64) PRIMARY KEY NOT NULL,
+	hash char(64) COLLATE "C" PRIMARY KEY NOT NULL,
 	type smallint NOT NULL,
 	mode smallint NOT NULL,
-	transmitter char(64) REFERENCES keys NOT NULL,
-	receiver char(64) REFERENCES keys,
+	transmitter char(64) COLLATE "C" REFERENCES keys NOT NULL,
+	receiver char(64) COLLATE "C" REFERENCES keys,
 	server_timestamp timestamp DEFAULT NOW() NOT NULL,
 	client_timestamp timestamp NOT NULL,
 	raw_client_timestamp varchar(24) NOT NULL,
 	transaction_data json NOT NULL,
-	sign char(256) NOT NULL,
+	sign_raw bytea NOT NULL,
 	updated_quantity json DEFAULT NULL,
-	errors varchar(64)[] DEFAULT NULL
+	errors varchar(64)[] DEFAULT NULL,
+	sign_verified boolean DEFAULT NULL
 );
 
+CREATE INDEX transactions_client_ts_idx ON transactions(client_timestamp DESC);
+
 CREATE TABLE available_inputs(
-	key_hash char(64) REFERENCES keys NOT NULL,
+	key_hash char(64) COLLATE "C" REFERENCES keys NOT NULL,
 	product varchar(64) NOT NULL,
 	inputs json[] NOT NULL,
 	PRIMARY KEY(key_hash, product)
 );
 
 CREATE TABLE t_inputs(
-	t_hash char(64) REFERENCES transactions NOT NULL,
-	input char(64) REFERENCES transactions NOT NULL,
+	t_hash char(64) COLLATE "C" REFERENCES transactions NOT NULL,
+	input char(64) COLLATE "C" REFERENCES transactions NOT NULL,
 	product varchar(64) NOT NULL,
 	PRIMARY KEY(t_hash, input, product)
 );
 
+CREATE INDEX t_inputs_t_hash_product_idx ON t_inputs(t_hash, product);
+CREATE INDEX t_inputs_input_product_idx ON t_inputs(input, product);
+
 CREATE TABLE product_id(
 	id varchar(64) PRIMARY KEY NOT NULL,
 	product varchar(64) NOT NULL,
-	first_transaction char(64) REFERENCES transactions NOT NULL,
-	last_transaction char(64) REFERENCES transactions NOT NULL,
-	owner varchar(64) REFERENCES keys,
+	first_transaction char(64) COLLATE "C" REFERENCES transactions NOT NULL,
+	last_transaction char(64) COLLATE "C" REFERENCES transactions NOT NULL,
+	owner char(64) COLLATE "C" REFERENCES keys,
 	destination varchar(64)
 );
 
@@ -23,8 +23,8 @@ module.exports.newkey = function(name, hash, public_key){
 
 //Añade una nueva transacción a la base de datos
 module.exports.newtransaction = function(transaction){
-    var query = "INSERT INTO transactions (hash, type, mode, transmitter, receiver, client_timestamp, raw_client_timestamp, transaction_data, sign) \
-    VALUES ($1, $2, $3, $4, $5, to_timestamp($6), '" + transaction.timestamp + "', $7, $8)";
+    var query = "INSERT INTO transactions (hash, type, mode, transmitter, receiver, client_timestamp, raw_client_timestamp, transaction_data, sign_raw) \
+    VALUES ($1, $2, $3, $4, $5, to_timestamp($6), '" + transaction.timestamp + "', $7, decode($8, 'hex'))";
     values = [transaction.hash, transaction.type, transaction.mode, transaction.transmitter, transaction.receiver? transaction.receiver : null, transaction.timestamp, transaction.data, transaction.sign];
     return new Promise((suc, rej) => {
         pool.query(query, values, (err, res) => {
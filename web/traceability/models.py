@@ -1,13 +1,23 @@
 from django.db import models
 from django.contrib.postgres.fields import JSONField, ArrayField
 from django.urls import reverse
+from django.utils.functional import cached_property
 
-from collections import OrderedDict
+from functools import lru_cache
+import hashlib
 import json
 
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+
+#Carga una clave pública PEM. El hash de la clave la identifica de forma única, así que el resultado se reutiliza entre verificaciones
+#OpenSSL guarda en el objeto de la clave su contexto Montgomery (R² mod N), por lo que tampoco se recalcula en cada verificación
+@lru_cache(maxsize=1024)
+def _load_pubkey(key_hash, public_key):
+    return serialization.load_pem_public_key(public_key.encode('utf-8'), backend=default_backend())
 
 #Modelo clave, representa una clave pública de una etapa de la cadena de producción
 class Key(models.Model):
@@ -18,13 +28,20 @@ class Key(models.Model):
     name = models.CharField('Nombre', max_length=50)
     description = models.TextField('Descripción', max_length=300, null=True, blank=True)
 
+    #El hash solo se recalcula si se guarda la clave pública
     def save(self, *args, **kwargs):
-        self.hash = SHA256.new(self.public_key.encode('utf-8')).hexdigest()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'public_key' in update_fields:
+            self.hash = hashlib.sha256(self.public_key.encode('utf-8')).hexdigest()
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('key_details', kwargs={'hash': self.hash})
 
+    @cached_property
+    def public_key_object(self):
+        return _load_pubkey(self.hash, self.public_key)
+
     def __str__(self):
         return self.name
 
@@ -42,33 +59,53 @@ class Transaction(models.Model):
     client_timestamp = models.DateTimeField()
     raw_client_timestamp = models.CharField(max_length = 24)
     transaction_data = JSONField()
-    sign = models.CharField(max_length=256)
+    sign_raw = models.BinaryField()
     updated_quantity = JSONField()
     errors = ArrayField(models.CharField(max_length = 64))
+    sign_verified = models.BooleanField(null=True)
 
     class Meta:
         db_table = 'transactions'
         ordering = ('-client_timestamp',)
+        indexes = [
+            models.Index(fields=['-client_timestamp'], name='transactions_client_ts_idx'),
+        ]
     
     def __str__(self):
         return self.hash
 
-    def verify_sign(self):
-        ordered_data = OrderedDict(sorted(self.transaction_data.items()))
-        transaction = [("type", self.type), ("mode", self.mode), ("transmitter", self.transmitter.hash)]
-        if(self.receiver):
-            transaction.append(("receiver", self.receiver.hash))
-        transaction.extend([("timestamp", self.raw_client_timestamp), ("data", ordered_data)])
-        transaction = OrderedDict(transaction)
-        serialized_transaction = json.dumps(transaction, separators = (',',':'))
-        calculated_hash = SHA256.new(serialized_transaction.encode('utf-8'))
-
-        if self.hash != calculated_hash.hexdigest():
+    #Serializa la transacción tal y como la firma el cliente. Los diccionarios conservan el orden de inserción,
+    #por lo que el orden de las claves es el mismo que genera el cliente con OrderedDict
+    def serialize(self):
+        transaction = {"type": self.type, "mode": self.mode, "transmitter": self.transmitter_id}
+        if self.receiver_id:
+            transaction["receiver"] = self.receiver_id
+        transaction["timestamp"] = self.raw_client_timestamp
+        transaction["data"] = dict(sorted(self.transaction_data.items()))
+        return json.dumps(transaction, separators = (',',':')).encode('utf-8')
+
+    #Verifica el hash y la firma. Se puede indicar la transacción ya serializada para no volver a generarla
+    def verify_sign(self, serialized_transaction = None):
+        if serialized_transaction is None:
+            serialized_transaction = self.serialize()
+        calculated_hash = hashlib.sha256(serialized_transaction).digest()
+
+        if self.hash != calculated_hash.hex():
+            return False
+
+        #El digest ya calculado se pasa como Prehashed para no volver a aplicar SHA-256 durante la verificación
+        try:
+            self.transmitter.public_key_object.verify(bytes(self.sign_raw), calculated_hash, padding.PKCS1v15(), Prehashed(hashes.SHA256()))
+        except InvalidSignature:
             return False
+        return True
 
-        keyobject = RSA.importKey(self.transmitter.public_key)
-        verifier = PKCS1_v1_5.new(keyobject)
-        return verifier.verify(calculated_hash, bytes.fromhex(self.sign))
+    #Devuelve el resultado de verificar la firma. Se calcula solo la primera vez y se almacena, ya que la transacción no cambia
+    def check_sign(self):
+        if self.sign_verified is None:
+            self.sign_verified = self.verify_sign()
+            self.save(update_fields=['sign_verified'])
+        return self.sign_verified
 
 #Modelo entrada de transacción, representa un enlace entre dos transacciones
 class TransactionInput(models.Model):
@@ -79,6 +116,10 @@ class TransactionInput(models.Model):
     class Meta:
         db_table = 't_inputs'
         unique_together = (('t_hash', 'input', 'product'),)
+        indexes = [
+            models.Index(fields=['t_hash', 'product'], name='t_inputs_t_hash_product_idx'),
+            models.Index(fields=['input', 'product'], name='t_inputs_input_product_idx'),
+        ]
 
 #Modelo identificador de producto, mantiene el identificador y los detalles de un determinado producto
 class ProductID(models.Model):
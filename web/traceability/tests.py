@@ -1,3 +1,177 @@
-from django.test import TestCase
+from django.test import RequestFactory, SimpleTestCase
 
-# Create your tests here.
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+from unittest import mock
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from .models import Key, Product, Transaction
+from . import utils, views
+
+#Genera una clave como las que registra el cliente (RSA 1024 en formato PEM)
+def make_key():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=1024, backend=default_backend())
+    public_key = private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo).decode('utf-8')
+    key = Key(public_key=public_key, name='key')
+    key.hash = hashlib.sha256(public_key.encode('utf-8')).hexdigest()
+    return private_key, key
+
+#Serializa y firma la transacción igual que pyTraceability.Connection
+def sign_transaction(private_key, transmitter, receiver, timestamp, data):
+    ordered_data = OrderedDict(sorted(data.items()))
+    transaction = [("type", 2), ("mode", 0), ("transmitter", transmitter.hash)]
+    if(receiver):
+        transaction.append(("receiver", receiver.hash))
+    transaction.extend([("timestamp", timestamp), ("data", ordered_data)])
+    serialized_transaction = json.dumps(OrderedDict(transaction), separators = (',',':')).encode('utf-8')
+    sign = private_key.sign(serialized_transaction, padding.PKCS1v15(), hashes.SHA256())
+    return hashlib.sha256(serialized_transaction).hexdigest(), sign
+
+#Clase base con dos claves y un generador de transacciones firmadas
+class SignedTransactionTestCase(SimpleTestCase):
+    def setUp(self):
+        self.private_key, self.transmitter = make_key()
+        _, self.receiver = make_key()
+
+    def make_transaction(self, data, receiver = None):
+        timestamp = '1539500000.123456'
+        hash, sign = sign_transaction(self.private_key, self.transmitter, receiver, timestamp, data)
+        return Transaction(hash=hash, type=2, mode=0, transmitter=self.transmitter, receiver=receiver,
+            raw_client_timestamp=timestamp, transaction_data=data, sign_raw=sign)
+
+class VerifySignTests(SignedTransactionTestCase):
+    def test_valid_sign(self):
+        t = self.make_transaction({'product': [['p1', 5]], 'origin': 'o1'}, self.receiver)
+        self.assertTrue(t.verify_sign())
+
+    def test_valid_sign_without_receiver(self):
+        t = self.make_transaction({'product': [['p1', None]], 'destination': 'd1'})
+        self.assertTrue(t.verify_sign())
+
+    def test_valid_sign_non_ascii(self):
+        t = self.make_transaction({'product': [['p1', 5]], 'descripción': 'Jamón ibérico', 'extra': {'b': 1, 'a': 2}}, self.receiver)
+        self.assertTrue(t.verify_sign())
+
+    def test_wrong_sign(self):
+        t = self.make_transaction({'product': [['p1', 5]]}, self.receiver)
+        t.sign_raw = bytes([t.sign_raw[0] ^ 1]) + t.sign_raw[1:]
+        self.assertFalse(t.verify_sign())
+
+    def test_short_sign(self):
+        t = self.make_transaction({'product': [['p1', 5]]}, self.receiver)
+        t.sign_raw = t.sign_raw[:64]
+        self.assertFalse(t.verify_sign())
+
+    def test_tampered_hash(self):
+        t = self.make_transaction({'product': [['p1', 5]]}, self.receiver)
+        t.hash = hashlib.sha256(b'other').hexdigest()
+        self.assertFalse(t.verify_sign())
+
+    def test_tampered_data(self):
+        t = self.make_transaction({'product': [['p1', 5]]}, self.receiver)
+        t.transaction_data = {'product': [['p1', 6]]}
+        self.assertFalse(t.verify_sign())
+
+class VerifyManyTests(SignedTransactionTestCase):
+    def test_results_keep_order_across_chunks(self):
+        transactions = [self.make_transaction({'product': [['p%d' % i, i]]}, self.receiver) for i in range(5)]
+        transactions[3].hash = hashlib.sha256(b'other').hexdigest()
+        self.assertEqual(utils.verify_many(transactions, chunk_size = 2), [True, True, True, False, True])
+
+    def test_results_keep_order_with_threads(self):
+        transactions = [self.make_transaction({'product': [['p%d' % i, i]]}, self.receiver) for i in range(5)]
+        transactions[0].sign_raw = transactions[1].sign_raw
+        with mock.patch('traceability.utils.os.cpu_count', return_value = 2):
+            self.assertEqual(utils.verify_many(transactions, chunk_size = 2), [False, True, True, True, True])
+
+    def test_invalid_key_does_not_abort(self):
+        transactions = [self.make_transaction({'product': [['p%d' % i, i]]}, self.receiver) for i in range(3)]
+        transactions[1].transmitter = Key(hash=self.transmitter.hash, public_key='not a key', name='key')
+        self.assertEqual(utils.verify_many(transactions), [True, None, True])
+
+    def test_reverify_bulk_updates_per_chunk(self):
+        transactions = [self.make_transaction({'product': [['p%d' % i, i]]}, self.receiver) for i in range(5)]
+        transactions[2].hash = hashlib.sha256(b'other').hexdigest()
+        transactions[4].transmitter = Key(hash=self.transmitter.hash, public_key='not a key', name='key')
+        queryset = mock.Mock()
+        queryset.select_related.return_value.iterator.return_value = iter(transactions)
+        with mock.patch('traceability.utils.Transaction.objects') as objects:
+            self.assertEqual(utils.reverify_bulk(queryset, chunk_size = 2), (3, 2, 1))
+        updates = [(c[1]['hash__in'], u[1]['sign_verified']) for c, u in zip(objects.filter.call_args_list, objects.filter.return_value.update.call_args_list)]
+        self.assertEqual(updates, [
+            ([transactions[0].hash, transactions[1].hash], True),
+            ([transactions[3].hash], True),
+            ([transactions[2].hash], False),
+            ([transactions[4].hash], False),
+        ])
+
+    def test_serialize_error_does_not_abort(self):
+        transactions = [self.make_transaction({'product': [['p%d' % i, i]]}, self.receiver) for i in range(3)]
+        transactions[1].transaction_data = None
+        self.assertEqual(utils.verify_many(transactions), [True, None, True])
+
+    def test_serializes_on_calling_thread(self):
+        transactions = [self.make_transaction({'product': [['p%d' % i, i]]}, self.receiver) for i in range(4)]
+        serialize = Transaction.serialize
+        threads = set()
+        def record_thread(t):
+            threads.add(threading.get_ident())
+            return serialize(t)
+        with mock.patch('traceability.utils.os.cpu_count', return_value = 2), \
+                mock.patch.object(Transaction, 'serialize', autospec = True, side_effect = record_thread):
+            self.assertEqual(utils.verify_many(transactions, chunk_size = 2), [True] * 4)
+        self.assertEqual(threads, {threading.get_ident()})
+
+class ProductListTests(SimpleTestCase):
+    def setUp(self):
+        self.view = views.TransactionDetail()
+        self.products = {'p1': Product(code='p1', name='Producto', measure_unit='kg', multiplier=10)}
+
+    def test_with_quantity(self):
+        self.assertEqual(self.view.make_product_list_with_quantity([['p1', 20], ['p2', None]], self.products), [
+            {'product': 'p1', 'name': 'Producto', 'quantity': 20, 'unit': 'kg', 'multiplier': 10},
+            {'product': 'p2', 'name': None, 'quantity': None},
+        ])
+
+    def test_with_id(self):
+        self.assertEqual(self.view.make_product_list_with_id([['p1', 'id1'], ['p2', 'id2']], self.products), [
+            {'product': 'p1', 'name': 'Producto', 'id': 'id1'},
+            {'product': 'p2', 'name': None, 'id': 'id2'},
+        ])
+
+    def test_with_newid(self):
+        self.assertEqual(self.view.make_product_list_with_newid([['p2', 1]], self.products, 'new1'), [
+            {'product': 'p2', 'name': None, 'newid': 'new1'},
+        ])
+
+class KeyStatusTests(SimpleTestCase):
+    def request(self):
+        request = RequestFactory().get('/', {'next': '/keys/'})
+        request.user = mock.Mock(is_staff = True)
+        return request
+
+    def change_status(self, view, updated, name):
+        with mock.patch('traceability.views.Key.objects') as objects, mock.patch('traceability.views.messages') as messages:
+            objects.filter.return_value.update.return_value = updated
+            objects.filter.return_value.values_list.return_value.first.return_value = name
+            view(self.request(), 'h')
+        return objects, messages
+
+    def test_activate(self):
+        objects, messages = self.change_status(views.ActivateKey, 1, 'key')
+        objects.filter.return_value.update.assert_called_once_with(current_status = 'active')
+        messages.add_message.assert_called_once_with(mock.ANY, messages.SUCCESS, "La clave 'key' se ha activado correctamente.")
+
+    def test_not_found_skips_name_lookup(self):
+        objects, messages = self.change_status(views.DeactivateKey, 0, None)
+        objects.filter.return_value.values_list.assert_not_called()
+        messages.add_message.assert_called_once_with(mock.ANY, messages.ERROR, "No se ha encontrado la clave.")
+
+    def test_deleted_after_update(self):
+        objects, messages = self.change_status(views.DeactivateKey, 1, None)
+        messages.add_message.assert_called_once_with(mock.ANY, messages.ERROR, "No se ha encontrado la clave.")
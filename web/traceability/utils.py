@@ -1,6 +1,8 @@
 import requests
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from django.core.exceptions import ObjectDoesNotExist
 from .models import TransactionInput, Transaction, Origin
 from django.conf import settings
@@ -44,4 +46,67 @@ def get_origins(product_id_obj):
                 except ObjectDoesNotExist: o = t.transaction_data['origin']
                 origin_dict[t.transaction_data['product'][0][0]].append(o)
     
-    return origin_dict
\ No newline at end of file
+    return origin_dict
+
+#Verifica la firma de un bloque de transacciones ya serializadas. Si una transacción no se ha podido serializar o verificar
+#(por ejemplo, porque la clave almacenada no es válida) su resultado es None y se continúa con el resto del bloque
+def _verify_chunk(chunk):
+    results = []
+    for t, serialized in chunk:
+        if serialized is None:
+            results.append(None)
+            continue
+        try:
+            results.append(t.verify_sign(serialized))
+        except Exception:
+            results.append(None)
+    return results
+
+#Serializa una transacción, devolviendo None si no es posible
+def _serialize(t):
+    try:
+        return t.serialize()
+    except Exception:
+        return None
+
+#Verifica en paralelo la firma de varias transacciones y devuelve los resultados en el mismo orden (True, False o None si falla la verificación).
+#Cada verificación es muy corta, así que las transacciones se reparten en bloques para que el coste de cada tarea del pool no supere al de la propia verificación
+def verify_many(transactions, chunk_size = 100):
+    chunks = []
+    for i, t in enumerate(transactions):
+        if i % chunk_size == 0:
+            chunks.append([])
+        #Se accede al emisor para que, si no se obtuvo con select_related, la consulta se haga aquí y no desde los hilos.
+        #La serialización también se hace aquí, ya que no libera el GIL y los hilos solo deben ejecutar la verificación de OpenSSL
+        t.transmitter
+        chunks[-1].append((t, _serialize(t)))
+    workers = os.cpu_count() or 1
+    if workers == 1 or len(chunks) <= 1:
+        return [result for chunk in chunks for result in _verify_chunk(chunk)]
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        return [result for results in executor.map(_verify_chunk, chunks) for result in results]
+
+#Verifica un bloque de transacciones y almacena el resultado. Las que no se han podido verificar se marcan como no verificadas
+def _reverify_chunk(transactions):
+    results = verify_many(transactions)
+    verified = [t.hash for t, correct in zip(transactions, results) if correct]
+    failed = [t.hash for t, correct in zip(transactions, results) if not correct]
+    if verified:
+        Transaction.objects.filter(hash__in = verified).update(sign_verified = True)
+    if failed:
+        Transaction.objects.filter(hash__in = failed).update(sign_verified = False)
+    return len(verified), len(failed), results.count(None)
+
+#Vuelve a verificar la firma de un conjunto de transacciones y almacena el resultado. Se recorre por bloques para no cargar toda la tabla en memoria.
+#Devuelve el número de transacciones verificadas, el de no verificadas y, de estas últimas, cuántas han fallado al verificarse
+def reverify_bulk(queryset, chunk_size = 1000):
+    verified = failed = errors = 0
+    transactions = queryset.select_related('transmitter').iterator(chunk_size = chunk_size)
+    chunk = list(islice(transactions, chunk_size))
+    while chunk:
+        chunk_verified, chunk_failed, chunk_errors = _reverify_chunk(chunk)
+        verified += chunk_verified
+        failed += chunk_failed
+        errors += chunk_errors
+        chunk = list(islice(transactions, chunk_size))
+    return verified, failed, errors
\ No newline at end of file
@@ -11,6 +11,7 @@ from .models import *
 from django.http import Http404
 from traceability import utils
 from traceability_web.settings import QR_HOSTNAME
+from collections import defaultdict
 
 #Clase de la que heredarán las vistas disponibles solo para administradores
 class StaffRequired(LoginRequiredMixin, UserPassesTestMixin):
@@ -26,7 +27,7 @@ class Index(TemplateView):
 class ActiveKeysList(StaffRequired, ListView):
     model = Key
     template_name = 'traceability/keys/keyslist_active.html'
-    queryset = Key.objects.filter(current_status = 'active')
+    queryset = Key.objects.filter(current_status = 'active').only('hash', 'name', 'current_status')
     context_object_name = 'keys_list'
     paginate_by = 10
 
@@ -39,7 +40,7 @@ class ActiveKeysList(StaffRequired, ListView):
 class PendingKeysList(StaffRequired, ListView):
     model = Key
     template_name = 'traceability/keys/keyslist_pending.html'
-    queryset = Key.objects.filter(current_status = 'new')
+    queryset = Key.objects.filter(current_status = 'new').only('hash', 'name', 'current_status')
     context_object_name = 'keys_list'
     paginate_by = 10
 
@@ -52,7 +53,7 @@ class PendingKeysList(StaffRequired, ListView):
 class InactiveKeysList(StaffRequired, ListView):
     model = Key
     template_name = 'traceability/keys/keyslist_inactive.html'
-    queryset = Key.objects.filter(current_status = 'inactive')
+    queryset = Key.objects.filter(current_status = 'inactive').only('hash', 'name', 'current_status')
     context_object_name = 'keys_list'
     paginate_by = 10
 
@@ -72,24 +73,24 @@ class KeyDetails(StaffRequired, DetailView):
 #Activar una determinada clave
 @user_passes_test(lambda u: u.is_staff, login_url=reverse_lazy('login'))
 def ActivateKey(request, hash):
-    try:
-        k = Key.objects.get(hash = hash)
-        k.current_status = 'active'
-        k.save()
-        messages.add_message(request, messages.SUCCESS, "La clave '" + k.name + "' se ha activado correctamente.")
-    except ObjectDoesNotExist:
+    k = Key.objects.filter(hash = hash)
+    updated = k.update(current_status = 'active')
+    name = k.values_list('name', flat=True).first() if updated == 1 else None
+    if name is not None:
+        messages.add_message(request, messages.SUCCESS, "La clave '" + name + "' se ha activado correctamente.")
+    else:
         messages.add_message(request, messages.ERROR, "No se ha encontrado la clave.")
     return HttpResponseRedirect(request.GET.get('next', '/'))
 
 #Desactivar una determinada clave
 @user_passes_test(lambda u: u.is_staff, login_url=reverse_lazy('login'))
 def DeactivateKey(request, hash):
-    try:
-        k = Key.objects.get(hash = hash)
-        k.current_status = 'inactive'
-        k.save()
-        messages.add_message(request, messages.SUCCESS, "La clave '" + k.name + "' se ha desactivado correctamente.")
-    except ObjectDoesNotExist:
+    k = Key.objects.filter(hash = hash)
+    updated = k.update(current_status = 'inactive')
+    name = k.values_list('name', flat=True).first() if updated == 1 else None
+    if name is not None:
+        messages.add_message(request, messages.SUCCESS, "La clave '" + name + "' se ha desactivado correctamente.")
+    else:
         messages.add_message(request, messages.ERROR, "No se ha encontrado la clave.")
     return HttpResponseRedirect(request.GET.get('next', '/'))
 
@@ -132,15 +133,12 @@ class ModifyKey(StaffRequired, UpdateView):
 def KeySearch(request):
     searchbox = request.GET.get('sb')
     if searchbox:
-        if Key.objects.filter(hash = searchbox).exists():
-            url = reverse('key_details', kwargs={'hash': searchbox})
+        key_hash = Key.objects.filter(Q(hash = searchbox) | Q(name = searchbox)).values_list('hash', flat=True).first()
+        if key_hash:
+            url = reverse('key_details', kwargs={'hash': key_hash})
         else:
-            k = Key.objects.filter(name = searchbox)
-            if k.exists():
-                url = reverse('key_details', kwargs={'hash': k[0].hash})
-            else:
-                messages.add_message(request, messages.ERROR, "No se ha encontrado la clave.")
-                url = reverse('keys')
+            messages.add_message(request, messages.ERROR, "No se ha encontrado la clave.")
+            url = reverse('keys')
     else:
         url = reverse('keys')
     return HttpResponseRedirect(url)
@@ -149,6 +147,9 @@ def KeySearch(request):
 class TransactionsList(ListView):
     model = Transaction
     template_name = 'traceability/transactions/transactions_list.html'
+    queryset = Transaction.objects.select_related('transmitter', 'receiver').defer(
+        'transaction_data', 'updated_quantity', 'errors', 'sign_raw',
+        'transmitter__public_key', 'transmitter__description', 'receiver__public_key', 'receiver__description')
     context_object_name = 'transactions_list'
     paginate_by = 10
 
@@ -174,6 +175,7 @@ class AdvancedSearch(TemplateView):
 class TransactionDetail(DetailView):
     model = Transaction
     template_name = 'traceability/transactions/transaction_details.html'
+    queryset = Transaction.objects.select_related('transmitter', 'receiver')
     context_object_name = 't'
     slug_url_kwarg = 'hash'
     slug_field = 'hash'
@@ -182,16 +184,18 @@ class TransactionDetail(DetailView):
         context = super().get_context_data(**kwargs)
         if context[self.context_object_name]:
             obj = context[self.context_object_name]
-            context['sign'] = obj.verify_sign()
+            context['sign'] = obj.check_sign()
             if 'new_id' in obj.transaction_data: newid = obj.transaction_data['new_id']
             else: newid = None
+            #En el modo 3 los productos de entrada se indican por identificador en lugar de por cantidad
+            by_id = obj.mode == 3 and obj.type != 0
             if 'product' in obj.transaction_data:
-                context['product'] = self.make_product_list(obj.transaction_data['product'], newid)
+                context['product'] = self.make_product_list(obj.transaction_data['product'], newid, by_id)
                 self.set_quantity(context['product'], obj.updated_quantity)
                 self.set_pre_transactions(context['product'], obj.hash)
                 self.set_post_transactions(context['product'], obj.hash)
             else:
-                context['product_in'] = self.make_product_list(obj.transaction_data['product_in'])
+                context['product_in'] = self.make_product_list(obj.transaction_data['product_in'], by_id = by_id)
                 context['product_out'] = self.make_product_list(obj.transaction_data['product_out'], newid)
                 self.set_quantity(context['product_in'], obj.updated_quantity)
                 self.set_quantity(context['product_out'], obj.updated_quantity)
@@ -207,26 +211,31 @@ class TransactionDetail(DetailView):
         return context
 
     #Genera la lista de productos
-    def make_product_list(self, p_list, newid = None):
+    def make_product_list(self, p_list, newid = None, by_id = False):
+        products = Product.objects.in_bulk([code for code, _ in p_list])
+        if newid:
+            return self.make_product_list_with_newid(p_list, products, newid)
+        if by_id:
+            return self.make_product_list_with_id(p_list, products)
+        return self.make_product_list_with_quantity(p_list, products)
+
+    #Genera la lista de productos a los que se asigna un nuevo identificador
+    def make_product_list_with_newid(self, p_list, products, newid):
+        return [{'product': code, 'name': getattr(products.get(code), 'name', None), 'newid': newid} for code, _ in p_list]
+
+    #Genera la lista de productos indicados por identificador
+    def make_product_list_with_id(self, p_list, products):
+        return [{'product': code, 'name': getattr(products.get(code), 'name', None), 'id': product_id} for code, product_id in p_list]
+
+    #Genera la lista de productos indicados por cantidad, con la unidad y el multiplicador del tipo de producto si está registrado
+    def make_product_list_with_quantity(self, p_list, products):
         l = []
-        for p in p_list:
-            l.append({})
-            l[-1]['product'] = p[0]
-            p_obj = None
-            try:
-                p_obj = Product.objects.get(code = p[0])
-                l[-1]['name'] = p_obj.name
-            except ObjectDoesNotExist:
-                pass
-            if newid:
-                l[-1]['newid'] = newid
-            elif isinstance(p[1], str):
-                l[-1]['id'] = p[1]
+        for code, quantity in p_list:
+            p_obj = products.get(code)
+            if p_obj:
+                l.append({'product': code, 'name': p_obj.name, 'quantity': quantity, 'unit': p_obj.measure_unit, 'multiplier': p_obj.multiplier})
             else:
-                l[-1]['quantity'] = p[1]
-                if p_obj:
-                    l[-1]['unit'] = p_obj.measure_unit
-                    l[-1]['multiplier'] = p_obj.multiplier
+                l.append({'product': code, 'name': None, 'quantity': quantity})
         return l
 
     # Establece la cantidad para aquellas transacciones que no la indiquen y cambia de unidad se fuese necesarios
@@ -239,15 +248,21 @@ class TransactionDetail(DetailView):
 
     # Establece las transacciones anteriores de cada producto
     def set_pre_transactions(self, p_list, hash):
+        in_dict = defaultdict(list)
+        products = [p['product'] for p in p_list]
+        for product, t_input in TransactionInput.objects.filter(t_hash = hash, product__in = products).values_list('product', 'input'):
+            in_dict[product].append(t_input)
         for p in p_list:
-            in_list = list(TransactionInput.objects.filter(t_hash = hash, product = p['product']).values_list('input', flat=True))
-            p['pre'] = in_list
+            p['pre'] = in_dict[p['product']]
 
     #Establece las transacciones siguientes de cada producto
     def set_post_transactions(self, p_list, hash):
+        out_dict = defaultdict(list)
+        products = [p['product'] for p in p_list]
+        for product, t_hash in TransactionInput.objects.filter(input = hash, product__in = products).values_list('product', 't_hash'):
+            out_dict[product].append(t_hash)
         for p in p_list:
-            out_list = list(TransactionInput.objects.filter(input = hash, product = p['product']).values_list('t_hash', flat=True))
-            p['post'] = out_list
+            p['post'] = out_dict[p['product']]
 
 #Cambia el estado del registro remoto enviando la petición correspondiente al servidor
 @user_passes_test(lambda u: u.is_staff, login_url=reverse_lazy('login'))